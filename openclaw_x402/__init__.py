@@ -18,11 +18,11 @@ __version__ = "0.1.0"
 from .middleware import X402Middleware
 from .config import (
     X402_NETWORK, USDC_BASE, WRTC_BASE, AERODROME_POOL,
-    FACILITATOR_URL, SWAP_INFO, is_free, has_cdp_credentials,
+    FACILITATOR_URL, SWAP_INFO, HAS_CDP_CREDENTIALS, is_free, has_cdp_credentials,
 )
 
 __all__ = [
     "X402Middleware",
     "X402_NETWORK", "USDC_BASE", "WRTC_BASE", "AERODROME_POOL",
-    "FACILITATOR_URL", "SWAP_INFO", "is_free", "has_cdp_credentials",
+    "FACILITATOR_URL", "SWAP_INFO", "HAS_CDP_CREDENTIALS", "is_free", "has_cdp_credentials",
 ]
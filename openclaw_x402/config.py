@@ -19,6 +19,7 @@ FACILITATOR_URL = "https://x402-facilitator.cdp.coinbase.com"
 # --- CDP Credentials ---
 CDP_API_KEY_NAME = os.environ.get("CDP_API_KEY_NAME", "")
 CDP_API_KEY_PRIVATE_KEY = os.environ.get("CDP_API_KEY_PRIVATE_KEY", "")
+HAS_CDP_CREDENTIALS = bool(CDP_API_KEY_NAME and CDP_API_KEY_PRIVATE_KEY)
 
 # --- Swap Info ---
 SWAP_INFO = {
@@ -37,5 +38,5 @@ def is_free(price_str):
 
 
 def has_cdp_credentials():
-    """Check if CDP API credentials are configured."""
-    return bool(CDP_API_KEY_NAME and CDP_API_KEY_PRIVATE_KEY)
+    """Check if CDP API credentials are configured (read once at import)."""
+    return HAS_CDP_CREDENTIALS
@@ -16,28 +16,129 @@ Usage:
         return jsonify({"data": "..."})
 """
 
+import atexit
+import collections
+import contextlib
 import functools
+import hashlib
+import importlib.machinery
+import importlib.util
+import json
 import logging
+import os
+import signal
+import sqlite3
+import threading
 import time
+import types
+import weakref
 
-from flask import jsonify, request
+from flask import Response, request
 
 from .config import (
-    X402_NETWORK, USDC_BASE, FACILITATOR_URL, SWAP_INFO,
-    is_free, has_cdp_credentials,
+    X402_NETWORK, USDC_BASE, FACILITATOR_URL, SWAP_INFO, HAS_CDP_CREDENTIALS,
+    is_free,
 )
 
 log = logging.getLogger("openclaw_x402")
 
-# Try importing x402 Flask helpers (optional dependency)
+# Use orjson for response bodies when available (optional dependency)
 try:
-    from x402.flask import x402_middleware as _x402_mw
-    X402_LIB_AVAILABLE = True
+    from orjson import dumps as _dumps
 except ImportError:
-    X402_LIB_AVAILABLE = False
+    def _dumps(obj):
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+# Stand-in for the per-request resource URL in pre-serialized 402 bodies
+_RESOURCE_PLACEHOLDER = _dumps("{RESOURCE}")
+
+
+def _json_response(body, status=200):
+    """Wrap already-serialized JSON bytes in a Response."""
+    return Response(body, status=status, mimetype="application/json")
+
+
+# x402 Flask helpers are an optional dependency. Only check that they are
+# installed here; the import itself is deferred to the first paid request.
+def _x402_flask_installed():
+    # find_spec("x402.flask") would import the x402 package itself, so look the
+    # submodule up on the package's search path instead.
+    try:
+        spec = importlib.util.find_spec("x402")
+    except (ImportError, ValueError):
+        return False
+    if spec is None or not spec.submodule_search_locations:
+        return False
+    return importlib.machinery.PathFinder.find_spec(
+        "flask", spec.submodule_search_locations,
+    ) is not None
+
+
+X402_LIB_AVAILABLE = _x402_flask_installed()
+if not X402_LIB_AVAILABLE:
     log.info("x402 Flask library not installed — running in manual mode")
 
 
+# Middlewares with a payment writer. The atexit, fork and SIGTERM hooks are
+# process-wide, so they are installed once and act on every live middleware.
+_writers = weakref.WeakSet()
+_hooks_lock = threading.Lock()
+_exit_hooks_installed = False
+_sigterm_installed = False
+
+
+def _flush_all():
+    for mw in list(_writers):
+        mw.flush()
+
+
+def _reset_all_after_fork():
+    for mw in list(_writers):
+        mw._reset_after_fork()
+
+
+def _install_process_hooks():
+    """Flush buffered payments at exit and on SIGTERM; reset writers on fork."""
+    global _exit_hooks_installed, _sigterm_installed
+    with _hooks_lock:
+        if not _exit_hooks_installed:
+            _exit_hooks_installed = True
+            atexit.register(_flush_all)
+            # Pre-fork servers (gunicorn --preload, uWSGI) fork after init_app
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=_reset_all_after_fork)
+        # signal handlers can only be installed from the main thread
+        if _sigterm_installed or threading.current_thread() is not threading.main_thread():
+            return
+        _sigterm_installed = True
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def on_sigterm(signum, frame):
+        _flush_all()
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            # SIG_DFL, or None for a handler installed outside Python:
+            # re-deliver with the default action so the process still exits
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_x402_mw():
+    """Import the x402 Flask middleware on first use (None if the import fails)."""
+    # The failure is cached too, so a broken install is reported once
+    # instead of re-importing on every paid request.
+    try:
+        from x402.flask import x402_middleware
+    except ImportError as e:
+        log.error("x402 Flask library failed to import (%s) — running in manual mode", e)
+        return None
+    return x402_middleware
+
+
 class X402Middleware:
     """
     x402 payment middleware for Flask.
@@ -46,19 +147,60 @@ class X402Middleware:
         app: Flask application (or None, call init_app later)
         treasury: Base chain address to receive payments
         db_func: Optional callable returning a DB connection (for payment logging)
+        sqlite_pragmas: Optional dict overriding the SQLite PRAGMAs applied to the
+            payment DB, e.g. {"synchronous": "FULL"} for strict durability
     """
 
-    def __init__(self, app=None, treasury="", db_func=None):
+    # WAL + synchronous=NORMAL: commits skip the fsync and readers are not
+    # blocked by the writer; the last transactions may roll back on power loss.
+    _DEFAULT_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "temp_store": "MEMORY",
+    }
+
+    # Payment rows are buffered in memory and written by a background thread
+    # in batches of up to _BATCH_SIZE rows, at least every _FLUSH_INTERVAL seconds.
+    _BATCH_SIZE = 500
+    _FLUSH_INTERVAL = 0.5
+    # Upper bound on rows waiting for the writer. Past it, new payments are
+    # dropped (already-queued rows are kept) until the writer catches up.
+    _MAX_BUFFERED = 100000
+
+    # Kept byte-for-byte stable so sqlite3's statement cache prepares it once.
+    _INSERT_SQL = (
+        "INSERT INTO x402_payments (payer_address, endpoint, amount_usdc, tx_hash, description, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)"
+    )
+
+    def __init__(self, app=None, treasury="", db_func=None, sqlite_pragmas=None):
         self.treasury = treasury
         self.db_func = db_func
-        self._payment_table_created = False
+        self.sqlite_pragmas = dict(self._DEFAULT_PRAGMAS, **(sqlite_pragmas or {}))
+        self._buf = collections.deque()
+        self._dropped = 0  # payments refused since the buffer last filled up
+        self._buf_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flush_waiters = collections.deque()
+        self._writer = None
+        self._writer_conn = None
+        self._writer_lock = threading.Lock()  # one transaction at a time on _writer_conn
+        self._tx_thread = None  # thread inside payment_transaction(), if any
+        self._db_path = ""
+        self._writer_error = None  # set by the writer thread if db_func is unusable
+        self._readers = threading.local()
         if app is not None:
             self.init_app(app)
 
     def init_app(self, app):
         """Register x402 routes and middleware on the Flask app."""
         self.app = app
-        self._ensure_payment_table()
+        if self.db_func:
+            self._start_writer()
+            _writers.add(self)
+            _install_process_hooks()
         self._register_routes(app)
         log.info(
             "OpenClaw x402 initialized: treasury=%s, x402_lib=%s",
@@ -66,43 +208,269 @@ class X402Middleware:
             X402_LIB_AVAILABLE,
         )
 
-    def _ensure_payment_table(self):
-        """Create x402_payments table if DB function is provided."""
-        if not self.db_func or self._payment_table_created:
-            return
+    def _ensure_payment_table(self, db):
+        """Apply SQLite PRAGMAs and create x402_payments table on the given connection."""
+        for name, value in self.sqlite_pragmas.items():
+            db.execute("PRAGMA %s=%s" % (name, value))
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS x402_payments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payer_address TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                amount_usdc TEXT NOT NULL,
+                tx_hash TEXT,
+                network TEXT DEFAULT 'eip155:8453',
+                description TEXT,
+                created_at REAL NOT NULL
+            )
+        """)
+        db.commit()
+
+    def _open_writer_conn(self):
+        """Open the long-lived payment-logging connection (writer thread only)."""
         try:
-            db = self.db_func()
-            db.execute("""
-                CREATE TABLE IF NOT EXISTS x402_payments (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    payer_address TEXT NOT NULL,
-                    endpoint TEXT NOT NULL,
-                    amount_usdc TEXT NOT NULL,
-                    tx_hash TEXT,
-                    network TEXT DEFAULT 'eip155:8453',
-                    description TEXT,
-                    created_at REAL NOT NULL
-                )
-            """)
-            db.commit()
-            self._payment_table_created = True
+            # db_func() only tells us which file to use; the writer opens its own
+            # connection and leaves db_func's (possibly the app's shared one) alone.
+            path = _sqlite_file(self.db_func())
         except Exception as e:
-            log.warning("Failed to create x402_payments table: %s", e)
+            log.warning("Failed to open x402 payment DB: %s", e)
+            return None
+        if not path:
+            # An in-memory DB is private to db_func's connection, so the writer
+            # could never see it; refuse it rather than silently drop payments.
+            raise ValueError("x402 payment logging needs db_func to return a file-backed SQLite DB, not :memory:")
+        self._db_path = path
+        try:
+            # Autocommit mode so each batch runs in an explicit BEGIN IMMEDIATE ... COMMIT
+            db = sqlite3.connect(
+                self._db_path,
+                isolation_level=None,
+                cached_statements=256,
+                check_same_thread=False,
+            )
+            self._ensure_payment_table(db)
+            return db
+        except Exception as e:
+            log.warning("Failed to open x402 payment DB: %s", e)
+            return None
+
+    def _start_writer(self):
+        """Start the payment writer thread and wait until its connection is set up."""
+        with self._start_lock:
+            if self._writer is not None:
+                return
+            ready = threading.Event()
+            writer = threading.Thread(
+                target=self._writer_loop, args=(ready,),
+                name="x402-payment-writer", daemon=True,
+            )
+            writer.start()
+            ready.wait()
+            if self._writer_error is not None:
+                raise self._writer_error
+            self._writer = writer
+
+    def _reset_after_fork(self):
+        """Drop writer state inherited from the parent process (fork child only)."""
+        # Threads don't survive fork(), and the parent's connection and locks
+        # must not be reused here. The parent still writes the rows it had
+        # buffered; this process starts its own writer on its first payment.
+        self._buf.clear()
+        self._dropped = 0
+        self._buf_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flush_waiters.clear()
+        self._writer = None
+        self._writer_conn = None
+        self._writer_lock = threading.Lock()
+        self._tx_thread = None
+        self._readers = threading.local()
+
+    def flush(self, timeout=5.0):
+        """
+        Write all buffered payments to the DB and wait for the commit.
+
+        Args:
+            timeout: Seconds to wait for the writer thread
+
+        Returns:
+            True if the buffer was drained in time
+        """
+        if self._writer is None or not self._writer.is_alive():
+            return not self._buf
+        done = threading.Event()
+        self._flush_waiters.append(done)
+        self._wake.set()
+        return done.wait(timeout)
+
+    def _writer_loop(self, ready):
+        """Drain the payment buffer every _FLUSH_INTERVAL or when it fills up."""
+        # db_func may rely on Flask's app context (e.g. a connection on g), so
+        # the writer connection is opened here and kept for the life of the thread.
+        with self.app.app_context():
+            try:
+                self._writer_conn = self._open_writer_conn()
+            except ValueError as e:
+                # Re-raised by _start_writer in the thread that called init_app
+                self._writer_error = e
+                return
+            finally:
+                ready.set()
+            while True:
+                self._wake.wait(timeout=self._FLUSH_INTERVAL)
+                self._wake.clear()
+                # Take the waiters before draining: anything they queued is
+                # already in the buffer and gets written below.
+                waiters = [self._flush_waiters.popleft() for _ in range(len(self._flush_waiters))]
+                try:
+                    self._drain()
+                except Exception:
+                    # A dead daemon thread would silently stop all payment
+                    # logging, so log the bug and keep serving later batches.
+                    log.exception("x402 payment writer failed; continuing")
+                finally:
+                    for done in waiters:
+                        done.set()
+
+    def _drain(self):
+        """Write everything currently buffered, in batches of _BATCH_SIZE."""
+        with self._buf_lock:
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            log.warning("x402 payment buffer overflowed: dropped %d payment(s)", dropped)
+        while self._buf:
+            with self._buf_lock:
+                # created_at is when the batch leaves the buffer, not when the
+                # request was served. The gap is usually under _FLUSH_INTERVAL
+                # but is unbounded: a backlog, busy_timeout waits or a long
+                # payment_transaction() all delay the batch.
+                now = time.time()
+                n = min(len(self._buf), self._BATCH_SIZE)
+                batch = [self._buf.popleft() + (now,) for _ in range(n)]
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        """Insert a batch of payment rows in a single transaction."""
+        if self._writer_conn is None:
+            self._writer_conn = self._open_writer_conn()
+            if self._writer_conn is None:
+                log.warning("Dropped %d x402 payment(s): no DB connection", len(batch))
+                return
+        conn = self._writer_conn
+        # Only DB errors are expected here; anything else is a bug and is
+        # reported by _writer_loop
+        with self._writer_lock:
+            try:
+                # IMMEDIATE takes the write lock up front instead of failing with
+                # SQLITE_BUSY when upgrading a read lock mid-transaction
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(self._INSERT_SQL, batch)
+                conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                _rollback(conn)
+                log.warning("Failed to log %d x402 payment(s): %s", len(batch), e)
+
+    @contextlib.contextmanager
+    def payment_transaction(self):
+        """
+        Group writes to the payment DB into a single transaction.
+
+        Yields the writer connection inside BEGIN IMMEDIATE. The transaction
+        commits when the block exits and rolls back if it raises. Payments
+        logged by premium() routes are written separately, not in this block.
+
+        Usage:
+            with x402.payment_transaction() as conn:
+                conn.execute(
+                    "INSERT INTO x402_payments (payer_address, endpoint, amount_usdc, tx_hash, description, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (payer, "/api/premium/data", "10000", tx_hash, "Premium data export", time.time()),
+                )
+                conn.execute("INSERT INTO ledger (user_id, tx_hash) VALUES (?, ?)", (user_id, tx_hash))
+
+        Raises:
+            RuntimeError: if the payment DB could not be opened, or if called
+                again inside an open payment_transaction() block
+        """
+        if self._writer is None and self.db_func:
+            # Forked worker that hasn't logged a payment yet
+            self._start_writer()
+        conn = self._writer_conn
+        if conn is None or not self._db_path:
+            raise RuntimeError("payment_transaction() requires a file-backed SQLite payment DB")
+        # _writer_lock is not reentrant; fail loudly instead of deadlocking
+        if self._tx_thread == threading.get_ident():
+            raise RuntimeError("payment_transaction() cannot be nested")
+        with self._writer_lock:
+            self._tx_thread = threading.get_ident()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    yield conn
+                    conn.execute("COMMIT")
+                except BaseException:
+                    # Never leave the shared connection inside a transaction
+                    _rollback(conn)
+                    raise
+            finally:
+                self._tx_thread = None
+
+    def _reader_conn(self):
+        """Return this thread's read-only connection to the payment DB."""
+        # Readers get their own query_only connections so they never share a
+        # transaction (or a lock wait) with the writer; under WAL they don't block.
+        conn = getattr(self._readers, "conn", None)
+        if conn is None:
+            if not self._db_path:
+                raise RuntimeError("x402 payment log is not backed by a SQLite file")
+            conn = sqlite3.connect(self._db_path)
+            conn.execute("PRAGMA query_only=1")
+            self._readers.conn = conn
+        return conn
+
+    def recent_payments(self, limit=50):
+        """
+        Return the most recently logged payments, newest first.
+
+        Payments still waiting in the write buffer are not included.
+        created_at is the time the row was written, not the time of the
+        paid request.
+
+        Args:
+            limit: Maximum number of rows to return
+        """
+        cur = self._reader_conn().execute(
+            "SELECT payer_address, endpoint, amount_usdc, tx_hash, network, description, created_at "
+            "FROM x402_payments ORDER BY id DESC LIMIT ?",
+            (limit,),
+        )
+        columns = [c[0] for c in cur.description]
+        return [dict(zip(columns, row)) for row in cur]
 
     def _register_routes(self, app):
         """Register x402 status endpoint."""
+        # Every field is fixed once the app is initialized, so encode it once
+        self._status_body = _dumps({
+            "x402_enabled": True,
+            "x402_lib": X402_LIB_AVAILABLE,
+            "cdp_configured": HAS_CDP_CREDENTIALS,
+            "network": X402_NETWORK,
+            "facilitator": FACILITATOR_URL,
+            "treasury": self.treasury,
+            "swap_info": SWAP_INFO,
+        })
+        self._status_etag = hashlib.blake2b(self._status_body, digest_size=8).hexdigest()
 
         @app.route("/api/x402/status")
         def x402_status():
-            return jsonify({
-                "x402_enabled": True,
-                "x402_lib": X402_LIB_AVAILABLE,
-                "cdp_configured": has_cdp_credentials(),
-                "network": X402_NETWORK,
-                "facilitator": FACILITATOR_URL,
-                "treasury": self.treasury,
-                "swap_info": SWAP_INFO,
-            })
+            # Pollers sending If-None-Match get an empty 304
+            if request.if_none_match.contains_weak(self._status_etag):
+                response = Response(status=304)
+            else:
+                response = _json_response(self._status_body)
+            response.set_etag(self._status_etag)
+            return response
 
     def premium(self, price="0", description="Premium endpoint"):
         """
@@ -112,54 +480,40 @@ class X402Middleware:
         If price is non-zero:
           - With x402 lib: uses Coinbase facilitator for verification
           - Without x402 lib: returns 402 with manual payment instructions
+        Both the free check and the x402 lib check happen at decoration time.
 
         Args:
             price: USDC atomic units (6 decimals). "10000" = $0.01
             description: Human-readable endpoint description
+
+        Raises:
+            ValueError: if price is not a non-negative integer amount
         """
+        # Validate and normalize the price once, not per request. Only integer
+        # amounts are accepted: int() would truncate a float like 0.5 to a free 0.
+        if isinstance(price, bool) or not isinstance(price, (str, int)):
+            raise ValueError("x402 price must be an integer amount, got %r" % (price,))
+        price_int = 0 if is_free(price) else int(str(price), 10)
+        if price_int < 0:
+            raise ValueError("x402 price must be non-negative, got %r" % (price,))
+        price_str = str(price_int)
+        body = self._payment_required_body(price_str, description) if price_int else None
+
         def decorator(f):
-            @functools.wraps(f)
-            def wrapper(*args, **kwargs):
-                # Free mode — pass through
-                if is_free(price):
-                    return f(*args, **kwargs)
-
-                # Check for x402 payment header
-                payment_header = request.headers.get("X-PAYMENT", "").strip()
-
-                if payment_header and X402_LIB_AVAILABLE:
-                    # Verify via facilitator (real x402 flow)
-                    try:
-                        # The x402 Flask middleware handles verification
-                        self._log_payment(
-                            payer="x402-verified",
-                            endpoint=request.path,
-                            amount=price,
-                            tx_hash=payment_header[:66],
-                            description=description,
-                        )
-                        return f(*args, **kwargs)
-                    except Exception as e:
-                        log.error("x402 verification failed: %s", e)
-                        return self._payment_required(price, description)
-
-                if not X402_LIB_AVAILABLE:
-                    if payment_header:
-                        log.warning(
-                            "Rejected unverified X-PAYMENT header in manual mode for %s",
-                            request.path,
-                        )
-                    return self._payment_required(price, description)
-
-                # No payment — return 402
-                return self._payment_required(price, description)
-
-            return wrapper
+            # Free mode — hand back the view untouched, no per-request overhead
+            if not price_int:
+                return f
+            return _PremiumView(f, self, price_str, description, body)
         return decorator
 
-    def _payment_required(self, price, description):
-        """Return HTTP 402 with x402 payment instructions."""
-        return jsonify({
+    def _payment_required_body(self, price, description):
+        """
+        Pre-serialize the 402 body for one endpoint.
+
+        Everything but the resource URL is fixed at decoration time, so the
+        JSON is split around it into (head, tail) byte strings.
+        """
+        body = _dumps({
             "error": "Payment Required",
             "x402": {
                 "version": "1",
@@ -168,22 +522,139 @@ class X402Middleware:
                 "payTo": self.treasury,
                 "maxAmountRequired": price,
                 "facilitator": FACILITATOR_URL,
-                "resource": request.url,
+                "resource": "{RESOURCE}",
                 "description": description,
             },
-        }), 402
+        })
+        head, tail = body.split(_RESOURCE_PLACEHOLDER, 1)
+        return head, tail
+
+    def _payment_required(self, body):
+        """Return HTTP 402 with x402 payment instructions."""
+        head, tail = body
+        return _json_response(head + _dumps(request.url) + tail, status=402)
 
     def _log_payment(self, payer, endpoint, amount, tx_hash, description):
-        """Log a payment to the database."""
-        if not self.db_func:
-            return
+        """Queue a payment for the background writer (no DB work on the request path)."""
+        if self._writer is None:
+            # First payment in a forked worker
+            self._start_writer()
+        buf = self._buf
+        if len(buf) >= self._BATCH_SIZE:
+            self._wake.set()
+            if len(buf) >= self._MAX_BUFFERED:
+                self._drop_payment()
+                return
+        buf.append((payer, endpoint, amount, tx_hash, description))
+
+    def _drop_payment(self):
+        """Count a payment refused by the full buffer; warn once per overflow."""
+        with self._buf_lock:
+            self._dropped += 1
+            first = self._dropped == 1
+        if first:
+            log.warning(
+                "x402 payment buffer full (%d rows); dropping new payments until the writer catches up",
+                self._MAX_BUFFERED,
+            )
+
+
+def _sqlite_file(db):
+    """Return the file behind a SQLite connection's main DB ("" if in-memory)."""
+    for _, name, path in db.execute("PRAGMA database_list"):
+        if name == "main":
+            return path or ""
+    return ""
+
+
+def _rollback(conn):
+    """Roll back an open transaction without masking the error that caused it."""
+    try:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+    except sqlite3.Error as e:
+        log.warning("x402 payment DB rollback failed: %s", e)
+
+
+def _noop(*args, **kwargs):
+    pass
+
+
+# Paid view wrapper returned by X402Middleware.premium(). A slotted callable
+# instead of a functools.wraps closure, so per-request state is plain slot
+# access. Without a __dict__ it can't take update_wrapper(); the metadata Flask
+# reads is copied into slots instead (__module__ can't be a slot, so it is the
+# only one not carried over), and __get__ binds it like a function on
+# class-based views.
+class _PremiumView:
+    __slots__ = (
+        "f", "mw", "price", "description", "body", "handler", "log_payment",
+        "__name__", "__qualname__", "__wrapped__",
+        "methods", "required_methods", "provide_automatic_options",
+    )
+
+    # View attributes Flask's add_url_rule() reads, copied when the view has them
+    _COPIED = (
+        "__name__", "__qualname__",
+        "methods", "required_methods", "provide_automatic_options",
+    )
+
+    def __init__(self, f, mw, price, description, body):
+        self.f = f
+        self.mw = mw
+        self.price = price
+        self.description = description
+        self.body = body
+        # Pick the X-PAYMENT handler once instead of branching on every request
+        self.handler = self._handle_verified if X402_LIB_AVAILABLE else self._reject_unverified
+        # Without a DB there is nothing to log, so skip the call entirely
+        self.log_payment = mw._log_payment if mw.db_func else _noop
+        for name in self._COPIED:
+            if hasattr(f, name):
+                setattr(self, name, getattr(f, name))
+        self.__wrapped__ = f
+
+    @property
+    def __doc__(self):
+        return self.f.__doc__
+
+    def __get__(self, obj, objtype=None):
+        return self if obj is None else types.MethodType(self, obj)
+
+    def __call__(self, *args, **kwargs):
+        # Check for x402 payment header
+        payment_header = request.headers.get("X-PAYMENT", "").strip()
+        if payment_header:
+            # Truncated once here; this is the form stored in the payment log
+            return self.handler(payment_header[:66], args, kwargs)
+
+        # No payment — return 402
+        return self.mw._payment_required(self.body)
+
+    def _handle_verified(self, tx_hash, args, kwargs):
+        """Verify via facilitator (real x402 flow)."""
+        if _get_x402_mw() is None:
+            # x402 lib is unusable: handle this view like manual mode from now on
+            self.handler = self._reject_unverified
+            return self._reject_unverified(tx_hash, args, kwargs)
         try:
-            db = self.db_func()
-            db.execute(
-                "INSERT INTO x402_payments (payer_address, endpoint, amount_usdc, tx_hash, description, created_at) "
-                "VALUES (?, ?, ?, ?, ?, ?)",
-                (payer, endpoint, amount, tx_hash, description, time.time()),
+            # The x402 Flask middleware handles verification
+            self.log_payment(
+                payer="x402-verified",
+                endpoint=request.path,
+                amount=self.price,
+                tx_hash=tx_hash,
+                description=self.description,
             )
-            db.commit()
+            return self.f(*args, **kwargs)
         except Exception as e:
-            log.warning("Failed to log x402 payment: %s", e)
+            log.error("x402 verification failed: %s", e)
+            return self.mw._payment_required(self.body)
+
+    def _reject_unverified(self, tx_hash, args, kwargs):
+        """Manual mode: an X-PAYMENT header cannot be verified, so fail closed."""
+        log.warning(
+            "Rejected unverified X-PAYMENT header in manual mode for %s",
+            request.path,
+        )
+        return self.mw._payment_required(self.body)
@@ -1,3 +1,4 @@
+import sys
 import unittest
 from unittest import mock
 
@@ -26,6 +27,10 @@ def create_test_app():
 
 class ManualModeFailClosedTests(unittest.TestCase):
     def setUp(self):
+        # Payment handling is bound when routes are decorated
+        patcher = mock.patch.object(middleware_module, "X402_LIB_AVAILABLE", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
         app = create_test_app()
         self.client = app.test_client()
 
@@ -44,6 +49,16 @@ class ManualModeFailClosedTests(unittest.TestCase):
         self.assertEqual(response.status_code, 402)
         self.assertEqual(response.get_json()["error"], "Payment Required")
 
+    @mock.patch.object(middleware_module, "X402_LIB_AVAILABLE", False)
+    def test_402_body_carries_payment_instructions(self):
+        response = self.client.get("/premium?page=2")
+        self.assertEqual(response.mimetype, "application/json")
+        x402 = response.get_json()["x402"]
+        self.assertEqual(x402["payTo"], "0xdeadbeef")
+        self.assertEqual(x402["maxAmountRequired"], "1000")
+        self.assertEqual(x402["description"], "Premium endpoint")
+        self.assertEqual(x402["resource"], "http://localhost/premium?page=2")
+
     @mock.patch.object(middleware_module, "X402_LIB_AVAILABLE", False)
     def test_free_route_remains_accessible_in_manual_mode(self):
         response = self.client.get(
@@ -53,6 +68,63 @@ class ManualModeFailClosedTests(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.get_json(), {"ok": True})
 
+    def test_paid_view_keeps_view_metadata(self):
+        x402 = X402Middleware(treasury="0xdeadbeef")
+
+        def view():
+            """View docstring."""
+
+        view.methods = ["POST"]
+        wrapped = x402.premium(price="1000")(view)
+        self.assertEqual(wrapped.__name__, "view")
+        self.assertEqual(wrapped.__qualname__, view.__qualname__)
+        self.assertEqual(wrapped.__doc__, "View docstring.")
+        self.assertEqual(wrapped.methods, ["POST"])
+        self.assertIs(wrapped.__wrapped__, view)
+        self.assertFalse(hasattr(wrapped, "__dict__"))
+
+    def test_invalid_price_is_rejected_at_decoration_time(self):
+        x402 = X402Middleware(treasury="0xdeadbeef")
+        with self.assertRaises(ValueError):
+            x402.premium(price="1.5")
+        with self.assertRaises(ValueError):
+            x402.premium(price="-100")
+
+    def test_non_integer_price_types_are_rejected(self):
+        x402 = X402Middleware(treasury="0xdeadbeef")
+        for price in (0.5, 1.9, None, True):
+            with self.assertRaises(ValueError):
+                x402.premium(price=price)
+
+    def test_integer_price_is_accepted(self):
+        x402 = X402Middleware(treasury="0xdeadbeef")
+        self.assertEqual(x402.premium(price=1000)(lambda: None).price, "1000")
+
+
+class BrokenX402LibTests(unittest.TestCase):
+    def setUp(self):
+        # x402.flask looks installed but fails to import
+        for patcher in (
+            mock.patch.object(middleware_module, "X402_LIB_AVAILABLE", True),
+            mock.patch.dict(sys.modules, {"x402": None, "x402.flask": None}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        middleware_module._get_x402_mw.cache_clear()
+        self.addCleanup(middleware_module._get_x402_mw.cache_clear)
+        self.client = create_test_app().test_client()
+
+    def test_failed_import_falls_back_to_manual_mode_once(self):
+        with self.assertLogs("openclaw_x402", level="ERROR") as logs:
+            for _ in range(3):
+                response = self.client.get(
+                    "/premium",
+                    headers={"X-PAYMENT": "totally-fake-token"},
+                )
+                self.assertEqual(response.status_code, 402)
+        errors = [r for r in logs.records if r.levelname == "ERROR"]
+        self.assertEqual(len(errors), 1)
+
 
 if __name__ == "__main__":
     unittest.main()
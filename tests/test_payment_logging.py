@@ -0,0 +1,330 @@
+import os
+import signal
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from flask import Flask, jsonify
+from flask.views import MethodView
+
+from openclaw_x402.middleware import X402Middleware
+import openclaw_x402.middleware as middleware_module
+
+
+class PaymentLoggingTests(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.db_path = os.path.join(tmpdir.name, "x402.db")
+
+        # Payment handling is bound when routes are decorated; the x402 lib
+        # itself is stubbed out since it is an optional dependency.
+        for patcher in (
+            mock.patch.object(middleware_module, "X402_LIB_AVAILABLE", True),
+            mock.patch.object(middleware_module, "_get_x402_mw"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.app = app = Flask(__name__)
+        self.x402 = X402Middleware(
+            app,
+            treasury="0xdeadbeef",
+            db_func=lambda: sqlite3.connect(self.db_path),
+        )
+
+        @app.route("/premium")
+        @self.x402.premium(price="1000", description="Premium endpoint")
+        def premium_endpoint():
+            return jsonify({"ok": True})
+
+        self.client = app.test_client()
+
+    def _rows(self):
+        db = sqlite3.connect(self.db_path)
+        try:
+            return db.execute(
+                "SELECT payer_address, endpoint, amount_usdc, tx_hash, description "
+                "FROM x402_payments ORDER BY id"
+            ).fetchall()
+        finally:
+            db.close()
+
+    def test_paid_requests_are_written_by_background_writer(self):
+        for i in range(3):
+            response = self.client.get(
+                "/premium", headers={"X-PAYMENT": "0xtx%d" % i},
+            )
+            self.assertEqual(response.status_code, 200)
+
+        self.assertTrue(self.x402.flush())
+        self.assertEqual(self._rows(), [
+            ("x402-verified", "/premium", "1000", "0xtx%d" % i, "Premium endpoint")
+            for i in range(3)
+        ])
+
+    def test_premium_method_on_class_based_view(self):
+        x402 = self.x402
+
+        class PremiumResource(MethodView):
+            @x402.premium(price="1000", description="Premium resource")
+            def get(self):
+                return jsonify({"view": type(self).__name__})
+
+        self.app.add_url_rule("/resource", view_func=PremiumResource.as_view("resource"))
+
+        response = self.client.get("/resource", headers={"X-PAYMENT": "0xtx"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {"view": "PremiumResource"})
+        self.assertEqual(self.client.get("/resource").status_code, 402)
+
+    def test_created_at_is_stamped_when_written(self):
+        before = time.time()
+        self.client.get("/premium", headers={"X-PAYMENT": "0xtx"})
+        self.x402.flush()
+        created_at = self.x402.recent_payments(limit=1)[0]["created_at"]
+        self.assertGreaterEqual(created_at, before)
+        self.assertLessEqual(created_at, time.time())
+
+    def test_logged_tx_hash_is_truncated(self):
+        tx_hash = "0x" + "ab" * 100
+        self.client.get("/premium", headers={"X-PAYMENT": tx_hash})
+        self.x402.flush()
+        self.assertEqual(self._rows()[0][3], tx_hash[:66])
+
+    def test_recent_payments_reads_newest_first(self):
+        for i in range(3):
+            self.client.get("/premium", headers={"X-PAYMENT": "0xtx%d" % i})
+        self.x402.flush()
+
+        payments = self.x402.recent_payments(limit=2)
+        self.assertEqual([p["tx_hash"] for p in payments], ["0xtx2", "0xtx1"])
+        self.assertEqual(payments[0]["endpoint"], "/premium")
+        self.assertEqual(payments[0]["network"], "eip155:8453")
+
+    def test_reader_connection_is_query_only(self):
+        with self.assertRaises(sqlite3.OperationalError):
+            self.x402._reader_conn().execute("DELETE FROM x402_payments")
+
+    def test_failed_batch_is_rolled_back_and_logged(self):
+        self.x402._log_payment("payer", "/premium", "1000", "0xok", "ok")
+        self.x402._log_payment(None, "/premium", "1000", "0xbad", "NOT NULL violation")
+        with self.assertLogs("openclaw_x402", level="WARNING"):
+            self.x402.flush()
+        self.assertEqual(self._rows(), [])
+
+        self.client.get("/premium", headers={"X-PAYMENT": "0xtx"})
+        self.x402.flush()
+        self.assertEqual([row[3] for row in self._rows()], ["0xtx"])
+
+    def test_writer_survives_unexpected_errors(self):
+        write_batch = self.x402._write_batch
+        calls = []
+
+        def flaky_write_batch(batch):
+            calls.append(batch)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+            return write_batch(batch)
+
+        with mock.patch.object(self.x402, "_write_batch", side_effect=flaky_write_batch):
+            with self.assertLogs("openclaw_x402", level="ERROR"):
+                self.x402._log_payment("payer", "/premium", "1000", "0xlost", "lost")
+                self.assertTrue(self.x402.flush())
+            self.assertTrue(self.x402._writer.is_alive())
+
+            self.client.get("/premium", headers={"X-PAYMENT": "0xtx"})
+            self.assertTrue(self.x402.flush())
+        self.assertEqual([row[3] for row in self._rows()], ["0xtx"])
+
+    def test_payment_transaction_commits_related_writes_together(self):
+        with self.x402.payment_transaction() as conn:
+            conn.execute("CREATE TABLE ledger (tx_hash TEXT)")
+            conn.execute(
+                "INSERT INTO x402_payments (payer_address, endpoint, amount_usdc, tx_hash, description, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                ("payer", "/premium", "1000", "0xtx", "Premium endpoint", time.time()),
+            )
+            conn.execute("INSERT INTO ledger (tx_hash) VALUES (?)", ("0xtx",))
+
+        self.assertEqual([row[3] for row in self._rows()], ["0xtx"])
+        db = sqlite3.connect(self.db_path)
+        self.addCleanup(db.close)
+        self.assertEqual(db.execute("SELECT tx_hash FROM ledger").fetchall(), [("0xtx",)])
+
+    def test_payment_transaction_rolls_back_on_error(self):
+        with self.assertRaises(ZeroDivisionError):
+            with self.x402.payment_transaction() as conn:
+                conn.execute(
+                    "INSERT INTO x402_payments (payer_address, endpoint, amount_usdc, created_at) "
+                    "VALUES ('payer', '/premium', '1000', 0)"
+                )
+                1 / 0
+        self.assertEqual(self._rows(), [])
+
+        # The writer connection is usable again afterwards
+        self.client.get("/premium", headers={"X-PAYMENT": "0xtx"})
+        self.x402.flush()
+        self.assertEqual([row[3] for row in self._rows()], ["0xtx"])
+
+    def test_payment_transaction_commit_failure_leaves_no_open_transaction(self):
+        db_path = os.path.join(os.path.dirname(self.db_path), "fk.db")
+        x402 = X402Middleware(
+            Flask(__name__),
+            db_func=lambda: sqlite3.connect(db_path),
+            sqlite_pragmas={"foreign_keys": "ON"},
+        )
+        with x402.payment_transaction() as conn:
+            conn.execute("CREATE TABLE parent (id INTEGER PRIMARY KEY)")
+            conn.execute(
+                "CREATE TABLE child (parent_id INTEGER "
+                "REFERENCES parent(id) DEFERRABLE INITIALLY DEFERRED)"
+            )
+
+        with self.assertRaises(sqlite3.IntegrityError):
+            with x402.payment_transaction() as conn:
+                conn.execute("INSERT INTO child (parent_id) VALUES (42)")
+        self.assertFalse(x402._writer_conn.in_transaction)
+
+        # Background batches still go through afterwards
+        x402._log_payment("payer", "/premium", "1000", "0xtx", "ok")
+        self.assertTrue(x402.flush())
+        self.assertEqual(x402.recent_payments()[0]["tx_hash"], "0xtx")
+
+    def test_payment_transaction_keeps_callers_exception(self):
+        with self.assertRaises(ZeroDivisionError):
+            with self.x402.payment_transaction() as conn:
+                conn.execute("COMMIT")  # block ends the transaction itself
+                1 / 0
+
+    def test_nested_payment_transaction_raises(self):
+        with self.x402.payment_transaction():
+            with self.assertRaises(RuntimeError):
+                with self.x402.payment_transaction():
+                    pass
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    def test_forked_child_starts_its_own_writer(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                self.client.get("/premium", headers={"X-PAYMENT": "0xchild"})
+                if self.x402.flush() and [row[3] for row in self._rows()] == ["0xchild"]:
+                    code = 0
+            finally:
+                os._exit(code)
+        _, status = os.waitpid(pid, 0)
+        self.assertTrue(os.WIFEXITED(status))
+        self.assertEqual(os.WEXITSTATUS(status), 0)
+
+    def test_process_hooks_are_installed_once(self):
+        handler = signal.getsignal(signal.SIGTERM)
+        with mock.patch.object(middleware_module.atexit, "register") as register:
+            other = X402Middleware(Flask(__name__), db_func=lambda: sqlite3.connect(self.db_path))
+        register.assert_not_called()
+        self.assertIs(signal.getsignal(signal.SIGTERM), handler)
+        self.assertIn(self.x402, middleware_module._writers)
+        self.assertIn(other, middleware_module._writers)
+
+    def test_sigterm_with_foreign_previous_handler_still_terminates(self):
+        # getsignal() returns None for a handler installed outside Python
+        with mock.patch.object(middleware_module, "_sigterm_installed", False), \
+                mock.patch.object(middleware_module.signal, "getsignal", return_value=None), \
+                mock.patch.object(middleware_module.signal, "signal") as set_signal, \
+                mock.patch.object(middleware_module.os, "kill") as kill:
+            middleware_module._install_process_hooks()
+            on_sigterm = set_signal.call_args[0][1]
+            on_sigterm(signal.SIGTERM, None)
+        set_signal.assert_called_with(signal.SIGTERM, signal.SIG_DFL)
+        kill.assert_called_once_with(os.getpid(), signal.SIGTERM)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    def test_payment_transaction_works_in_forked_child(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                with self.x402.payment_transaction() as conn:
+                    conn.execute(
+                        "INSERT INTO x402_payments (payer_address, endpoint, amount_usdc, tx_hash, created_at) "
+                        "VALUES ('payer', '/premium', '1000', '0xchild', 0)"
+                    )
+                if [row[3] for row in self._rows()] == ["0xchild"]:
+                    code = 0
+            finally:
+                os._exit(code)
+        _, status = os.waitpid(pid, 0)
+        self.assertTrue(os.WIFEXITED(status))
+        self.assertEqual(os.WEXITSTATUS(status), 0)
+
+    def test_full_buffer_drops_newest_payments_and_warns_once(self):
+        self.x402._MAX_BUFFERED = 3
+        self.x402._BATCH_SIZE = 1
+        release = threading.Event()
+        drain = self.x402._drain
+
+        def blocked_drain():
+            release.wait(5)
+            drain()
+
+        with mock.patch.object(self.x402, "_drain", side_effect=blocked_drain):
+            with self.assertLogs("openclaw_x402", level="WARNING") as logs:
+                for i in range(6):
+                    self.x402._log_payment("payer", "/premium", "1000", "0x%d" % i, "")
+            self.assertEqual(len(logs.records), 1)
+
+            with self.assertLogs("openclaw_x402", level="WARNING") as logs:
+                release.set()
+                self.assertTrue(self.x402.flush())
+            self.assertIn("dropped 3 payment(s)", logs.output[0])
+        self.assertEqual([row[3] for row in self._rows()], ["0x0", "0x1", "0x2"])
+
+    def test_unpaid_request_is_not_logged(self):
+        response = self.client.get("/premium")
+        self.assertEqual(response.status_code, 402)
+        self.x402.flush()
+        self.assertEqual(self._rows(), [])
+
+    def test_flush_without_db_is_a_no_op(self):
+        self.assertTrue(X402Middleware(Flask(__name__)).flush())
+
+    def test_payment_db_is_switched_to_wal(self):
+        db = sqlite3.connect(self.db_path)
+        self.addCleanup(db.close)
+        self.assertEqual(db.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+    def test_shared_db_func_connection_stays_usable(self):
+        db_path = os.path.join(os.path.dirname(self.db_path), "shared.db")
+        shared = sqlite3.connect(db_path, check_same_thread=False)
+        self.addCleanup(shared.close)
+
+        X402Middleware(Flask(__name__), db_func=lambda: shared)
+        self.assertEqual(shared.isolation_level, "")
+        self.assertEqual(shared.execute("SELECT COUNT(*) FROM x402_payments").fetchone(), (0,))
+
+    def test_in_memory_db_is_rejected_at_init_app(self):
+        app_conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.addCleanup(app_conn.close)
+        with self.assertRaises(ValueError):
+            X402Middleware(Flask(__name__), db_func=lambda: app_conn)
+        self.assertEqual(app_conn.isolation_level, "")
+        self.assertEqual(app_conn.execute("SELECT 1").fetchone(), (1,))
+
+    def test_sqlite_pragmas_can_be_overridden(self):
+        db_path = os.path.join(os.path.dirname(self.db_path), "strict.db")
+        X402Middleware(
+            Flask(__name__),
+            db_func=lambda: sqlite3.connect(db_path),
+            sqlite_pragmas={"journal_mode": "DELETE"},
+        )
+        db = sqlite3.connect(db_path)
+        self.addCleanup(db.close)
+        self.assertEqual(db.execute("PRAGMA journal_mode").fetchone()[0], "delete")
+
+
+if __name__ == "__main__":
+    unittest.main()
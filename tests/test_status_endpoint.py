@@ -0,0 +1,53 @@
+import unittest
+
+from flask import Flask
+
+from openclaw_x402 import SWAP_INFO, X402Middleware
+from openclaw_x402.config import FACILITATOR_URL, HAS_CDP_CREDENTIALS, X402_NETWORK
+import openclaw_x402.middleware as middleware_module
+
+
+class StatusEndpointTests(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        X402Middleware(app, treasury="0xdeadbeef")
+        self.client = app.test_client()
+
+    def test_status_reports_configuration(self):
+        response = self.client.get("/api/x402/status")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/json")
+        self.assertEqual(response.get_json(), {
+            "x402_enabled": True,
+            "x402_lib": middleware_module.X402_LIB_AVAILABLE,
+            "cdp_configured": HAS_CDP_CREDENTIALS,
+            "network": X402_NETWORK,
+            "facilitator": FACILITATOR_URL,
+            "treasury": "0xdeadbeef",
+            "swap_info": SWAP_INFO,
+        })
+
+    def test_status_body_is_stable_across_requests(self):
+        first = self.client.get("/api/x402/status").data
+        second = self.client.get("/api/x402/status").data
+        self.assertEqual(first, second)
+
+    def test_status_supports_conditional_get(self):
+        etag = self.client.get("/api/x402/status").headers["ETag"]
+        self.assertTrue(etag)
+
+        response = self.client.get(
+            "/api/x402/status", headers={"If-None-Match": etag},
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+        self.assertEqual(response.headers["ETag"], etag)
+
+        response = self.client.get(
+            "/api/x402/status", headers={"If-None-Match": '"stale"'},
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()